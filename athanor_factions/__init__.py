@@ -9,7 +9,7 @@ def init(settings, plugins: dict):
     settings.LOCK_FUNC_MODULES.append("athanor_factions.lockfuncs")
     settings.OPTION_CLASS_MODULES.append("athanor_factions.options")
 
-    settings.FACTION_PERMISSIONS_BUILTIN = {"roster", "invite", "discipline"}
+    settings.FACTION_PERMISSIONS_BUILTIN = frozenset({"roster", "invite", "discipline"})
 
     settings.OPTIONS_FACTION_DEFAULT = {
         "universal_permissions": ["Permissions granted to all members of the faction.", "FactionPermissions", ""],
@@ -1,8 +1,8 @@
 from django.conf import settings
 
 from athanor.commands import AthanorCommand
-from evennia.utils import class_from_module
 
+from .managers import faction_class
 from .models import Rank, Member, Invitation
 from rich.tree import Tree
 
@@ -12,7 +12,17 @@ class _FCmd(AthanorCommand):
 
     @property
     def f(self):
-        return class_from_module(settings.BASE_FACTION_TYPECLASS)
+        return faction_class()
+
+    def build_table(self, *columns, rows, title=None):
+        """
+        Builds a rich_table from already-formatted row tuples, so callers do all their
+        string work up front and Rich only ever sees finished cells.
+        """
+        t = self.rich_table(*columns, title=title)
+        for row in rows:
+            t.add_row(*row)
+        return t
 
     def build_tree(self, branch, data):
         for f in data:
@@ -21,8 +31,19 @@ class _FCmd(AthanorCommand):
                 self.build_tree(new_branch, children)
 
 
+_ADMIN_LOCKS = f"cmd:{settings.FACTION_PERMISSIONS_ADMIN_OVERRIDE}"
+
+
 class _FAdmin(_FCmd):
-    locks = f"cmd:{settings.FACTION_PERMISSIONS_ADMIN_OVERRIDE}"
+    locks = _ADMIN_LOCKS
+
+    def access(self, srcobj, access_type="cmd", default=False):
+        # The op will run check_override() again; going through it here means the
+        # lockstring is only evaluated once for the whole command. Commands whose
+        # locks were changed from the default are checked against those instead.
+        if access_type == "cmd" and self.locks == _ADMIN_LOCKS:
+            return self.f.objects.check_override(srcobj)
+        return super().access(srcobj, access_type=access_type, default=default)
 
 
 class CmdFCreate(_FAdmin):
@@ -252,18 +273,11 @@ class CmdFConfig(_FCmdSelected):
 
         f = op.results.get("faction")
 
-        t = self.rich_table(
-            "Name",
-            "Description",
-            "Type",
-            "Value",
-            title=f"'{f.full_path()}' Config Options",
+        rows = [(config["name"], config["description"], config["type"], config["value"]) for config in data]
+        self.buffer.append(
+            self.build_table("Name", "Description", "Type", "Value", rows=rows,
+                             title=f"'{f.full_path()}' Config Options")
         )
-        for config in data:
-            t.add_row(
-                config["name"], config["description"], config["type"], config["value"]
-            )
-        self.buffer.append(t)
 
 
 class CmdFList(_FCmd):
@@ -349,17 +363,19 @@ class CmdFaction(_FCmd):
 
         faction = op.results.get("faction")
 
-        t = self.rich_table("Name", "Rank", "Title", "Status", title=f"'Faction: {faction.full_path()}'")
-        for member in Member.objects.filter(rank__faction=faction).order_by("rank__number", "character__db_key"):
-            t.add_row(member.character.key, f"{member.rank.number}: {member.rank.name}", member.data.get("title", ""),
-                      "")
-
-        self.buffer.append(t)
-        if not (children := faction.children.all()):
+        members = (Member.objects.filter(faction=faction)
+                   .order_by("rank_number", "character__db_key")
+                   .values("character__db_key", "rank_number", "rank__name", "data"))
+        rows = [(m["character__db_key"], f"{m['rank_number']}: {m['rank__name']}", m["data"].get("title", ""), "")
+                for m in members]
+        self.buffer.append(
+            self.build_table("Name", "Rank", "Title", "Status", rows=rows, title=f"'Faction: {faction.full_path()}'")
+        )
+        if not (children := faction.serialize(include_children=True)["children"]):
             return
 
         tr = Tree("Sub-Factions")
-        self.build_tree(tr, [f.serialize(include_children=True) for f in children])
+        self.build_tree(tr, children)
         self.buffer.append(tr)
 
 
@@ -399,11 +415,11 @@ class CmdFRList(_FCmdSelected):
             self.msg("No ranks found.")
             return
 
-        t = self.rich_table("Number", "Name", "Permissions", title=f"'{faction.full_path()}' Ranks")
-        for rank in ranks:
-            data = rank.get("data", dict())
-            t.add_row(str(rank["number"]), rank["name"], " ".join(data.get("permissions", [])))
-        self.buffer.append(t)
+        rows = [(str(rank["number"]), rank["name"], " ".join(rank.get("data", dict()).get("permissions", [])))
+                for rank in ranks]
+        self.buffer.append(
+            self.build_table("Number", "Name", "Permissions", rows=rows, title=f"'{faction.full_path()}' Ranks")
+        )
 
 
 class CmdFRCreate(_FCmdSelected):
@@ -693,7 +709,8 @@ class CmdFIList(_FCmdSelected):
             self.msg("No invitations found.")
             return
 
-        t = self.rich_table("Character", "Inviter", title=f"'{op.results.get('faction').full_path()}' Invitations")
-        for invitation in invitations:
-            t.add_row(invitation["character"], invitation["inviter"])
-        self.buffer.append(t)
\ No newline at end of file
+        rows = [(invitation["character"], invitation["inviter"]) for invitation in invitations]
+        self.buffer.append(
+            self.build_table("Character", "Inviter", rows=rows,
+                             title=f"'{op.results.get('faction').full_path()}' Invitations")
+        )
\ No newline at end of file
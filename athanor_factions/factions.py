@@ -1,17 +1,18 @@
 import typing
 
 from django.conf import settings
+from django.db.models import Q
 
 from evennia.typeclasses.models import TypeclassBase
 from evennia.utils.optionhandler import OptionHandler
 from evennia.utils.utils import lazy_property
 
 import athanor
-from athanor.utils import partial_match
 from athanor.typeclasses.mixin import AthanorAccess
 
 from .managers import FactionManager
-from .models import FactionDB, Member
+from .models import FactionDB, Member, Rank
+from .utils import prefix_match
 
 
 class DefaultFaction(AthanorAccess, FactionDB, metaclass=TypeclassBase):
@@ -20,35 +21,45 @@ class DefaultFaction(AthanorAccess, FactionDB, metaclass=TypeclassBase):
     lock_access_functions = athanor.FACTION_ACCESS_FUNCTIONS
 
     def at_first_save(self):
+        specs = list()
         for rank, data in settings.FACTION_DEFAULT_RANKS.items():
+            # Copied rather than pop()'d, or the settings would lose their names after the first Faction.
+            data = dict(data)
             name = data.pop("name", "")
-            self.ranks.create(name=name, number=rank, data=data)
+            specs.append({"name": name, "number": rank, "data": data})
+        Rank.objects.bulk_create_default(self, specs)
+        if not self.db_full_path:
+            self.__class__.objects.update_path(self)
 
     def contains_sub_faction(self, faction):
-        for child in self.children.all():
-            if child == faction:
-                return True
-            if child.contains_sub_faction(faction):
-                return True
-        return False
+        if faction is None:
+            return False
+        return faction.full_path().startswith(f"{self.full_path()}/")
 
     def ancestors(self):
-        if self.parent:
-            yield self.parent
-            yield from self.parent.ancestors()
+        """
+        Yields this Faction's parent, grandparent, etc, fetched with a single recursive query.
+        """
+        if not self.db_parent_id:
+            return
+        table = FactionDB._meta.db_table
+        yield from FactionDB.objects.raw(
+            f"""WITH RECURSIVE anc (id, db_parent_id, depth) AS (
+                SELECT id, db_parent_id, 0 FROM {table} WHERE id = %s
+                UNION ALL
+                SELECT f.id, f.db_parent_id, anc.depth + 1 FROM {table} f JOIN anc ON anc.db_parent_id = f.id
+            )
+            SELECT f.* FROM {table} f JOIN anc ON anc.id = f.id ORDER BY anc.depth""",
+            [self.db_parent_id],
+        )
 
     def full_path(self):
-        chain = [self]
-        for ancestor in self.ancestors():
-            chain.append(ancestor)
-        return "/".join([f.key for f in reversed(chain)])
+        return self.db_full_path
 
     def is_deleted(self):
         if self.deleted:
             return True
-        if self.parent:
-            return self.parent.is_deleted()
-        return False
+        return any(ancestor.db_deleted for ancestor in self.ancestors())
 
     def serialize(self, include_parent=False, include_children=False):
         out = {
@@ -56,17 +67,25 @@ class DefaultFaction(AthanorAccess, FactionDB, metaclass=TypeclassBase):
             "key": self.key
         }
 
-        if include_parent and self.parent and not self.parent.deleted:
-            out["parent"] = self.parent.serialize(include_parent=True)
+        if include_parent:
+            node = out
+            for ancestor in self.ancestors():
+                if ancestor.db_deleted:
+                    break
+                node["parent"] = {"id": ancestor.id, "key": ancestor.db_key}
+                node = node["parent"]
 
         if include_children:
-            out["children"] = [child.serialize(include_parent=False, include_children=True) for child in
-                               self.children.filter(db_deleted=False)]
+            out["children"] = self.__class__.objects.serialize_tree(self)
 
         return out
 
     @lazy_property
     def options(self):
+        # Listing the Attributes fills the AttributeHandler's cache with one query, so
+        # the permission checks' several options.get() calls never go to the database
+        # one key at a time. The OptionHandler keeps loaded options after that.
+        self.attributes.all(category="option")
         return OptionHandler(self,
                              options_dict=settings.OPTIONS_FACTION_DEFAULT,
                              savefunc=self.attributes.add,
@@ -79,25 +98,26 @@ class DefaultFaction(AthanorAccess, FactionDB, metaclass=TypeclassBase):
         if check_admin:
             if self.__class__.objects.check_admin(character):
                 return True
-        if Member.objects.filter(character=character, rank__faction=self).exists():
-            return True
-        for child in self.children.all():
-            if child.is_member(character, check_admin=False):
-                return True
-        return False
+        return Member.objects.filter(self.lineage_q(), character=character).exists()
+
+    def lineage_q(self, prefix: str = "faction") -> Q:
+        """
+        Returns a Q matching this Faction or any of its descendants, through the
+        given relation prefix, so a whole branch of the tree can be searched at once.
+        """
+        return Q(**{prefix: self}) | Q(**{f"{prefix}__db_full_path__startswith": f"{self.full_path()}/"})
 
     def get_effective_rank(self, character) -> typing.Optional[int]:
         if self.__class__.objects.check_admin(character):
             return 0
-        if member := Member.objects.filter(character=character, rank__faction=self).first():
+        if member := self.get_member(character):
             return member.rank.number
         return None
 
     def is_leader(self, character) -> bool:
-        rank = self.get_effective_rank(character)
-        if rank is None:
-            return False
-        return rank <= 1
+        if self.__class__.objects.check_admin(character):
+            return True
+        return Member.objects.filter(character=character, faction=self, rank_number__lte=1).exists()
 
     def join_permissions(self, perm_sets: list[set[str]]):
         out = set()
@@ -105,40 +125,77 @@ class DefaultFaction(AthanorAccess, FactionDB, metaclass=TypeclassBase):
             out.update(perm_set)
         return {v for val in out if (v := val.strip().lower())}
 
-    def all_permissions(self) -> set[str]:
-        return self.join_permissions([self.options.get("permissions", set()),
-                                      settings.FACTION_PERMISSIONS_BUILTIN])
-
-    def get_effective_permissions(self, character) -> set[str]:
+    def all_permissions(self) -> frozenset[str]:
+        """
+        The builtin permissions plus this Faction's custom ones. This is cached on the
+        instance; FactionPermissions options call clear_permissions_cache() when saved.
+        """
+        if (found := getattr(self, "_all_permissions", None)) is None:
+            found = self._all_permissions = frozenset(
+                self.join_permissions([self.options.get("permissions", set()), settings.FACTION_PERMISSIONS_BUILTIN])
+            )
+        return found
+
+    def sorted_permissions(self) -> list[str]:
+        """
+        all_permissions() in sorted order, for prefix matching. Cached alongside it.
+        """
+        if (found := getattr(self, "_sorted_permissions", None)) is None:
+            found = self._sorted_permissions = sorted(self.all_permissions())
+        return found
+
+    def clear_permissions_cache(self):
+        self._all_permissions = None
+        self._sorted_permissions = None
+
+    def get_member(self, character) -> typing.Optional[Member]:
+        return (Member.objects.filter(character=character, faction=self).select_related("rank")
+                .only("data", "rank", "rank__number", "rank__data").order_by().first())
+
+    def is_sub_member(self, character) -> bool:
+        return Member.objects.filter(
+            character=character, faction__db_full_path__startswith=f"{self.full_path()}/"
+        ).exists()
+
+    def member_permissions(self, member: Member) -> set[str]:
+        """
+        Works out the permissions granted by an already-fetched Member row.
+        """
         all_permissions = self.all_permissions()
+        if member.rank.number <= 1:
+            return all_permissions
+        out = list()
+        out.append(self.options.get("universal_permissions", set()))
+        if rank_permissions := member.rank.data.get("permissions", set()):
+            out.append(rank_permissions)
+        if member_permissions := member.data.get("permissions", set()):
+            out.append(member_permissions)
+        return self.join_permissions(out).intersection(all_permissions)
 
+    def get_effective_permissions(self, character) -> set[str]:
         if self.__class__.objects.check_admin(character):
-            return all_permissions
+            return self.all_permissions()
 
-        if member := Member.objects.filter(character=character, rank__faction=self).first():
-            if member.rank.number <= 1:
-                return all_permissions
-            out = list()
-            out.append(self.options.get("universal_permissions", set()))
-            if rank_permissions := member.rank.data.get("permissions", set()):
-                out.append(rank_permissions)
-            if member_permissions := member.data.get("permissions", set()):
-                out.append(member_permissions)
-            return self.join_permissions(out).intersection(all_permissions)
+        # One query answers both "are they a Member here?" and "are they in a sub-faction?"
+        memberships = list(Member.objects.filter(self.lineage_q(), character=character).select_related("rank"))
 
-        if self.is_sub_member(character):
-            return self.join_permissions([self.options.get("sub_permissions", set())]).intersection(all_permissions)
+        if member := next((m for m in memberships if m.faction_id == self.id), None):
+            return self.member_permissions(member)
+
+        if memberships:
+            return self.join_permissions([self.options.get("sub_permissions", set())]).intersection(
+                self.all_permissions())
 
         return set()
 
     def has_permission(self, character, permission: str):
-        rank = self.get_effective_rank(character)
-        if rank is None:
+        if self.__class__.objects.check_admin(character):
+            return True
+        if not (member := self.get_member(character)):
             return False
-        if rank <= 1:
+        if member.rank.number <= 1:
             return True
-        permissions = self.get_effective_permissions(character)
-        return permission.strip().lower() in permissions
+        return permission.strip().lower() in self.member_permissions(member)
 
     def validate_permissions(self, perms: str):
         try:
@@ -148,11 +205,11 @@ class DefaultFaction(AthanorAccess, FactionDB, metaclass=TypeclassBase):
 
         out_permissions = set()
 
-        all_permissions = self.all_permissions()
+        sorted_permissions = self.sorted_permissions()
 
         for perm in entered_permissions:
-            if not (found_perm := partial_match(perm, all_permissions)):
-                raise ValueError(f"Permission {perm} not found! Choices: {all_permissions}")
+            if not (found_perm := prefix_match(perm, sorted_permissions)):
+                raise ValueError(f"Permission {perm} not found! Choices: {', '.join(sorted_permissions)}")
             out_permissions.add(found_perm)
 
         return list(out_permissions)
\ No newline at end of file
@@ -1,10 +1,9 @@
-from django.conf import settings
-from evennia.utils import class_from_module, lazy_property
+from evennia.objects.models import ObjectDB
 from athanor.utils import Operation
 
-from .models import Member, Rank
-
-_TYPECLASS = None
+from .managers import faction_class
+from .models import FactionDB
+from .utils import turn_cache
 
 
 class _LockFunctionHelper:
@@ -18,17 +17,23 @@ class _LockFunctionHelper:
 
     @property
     def typeclass(self):
-        global _TYPECLASS
-        if _TYPECLASS is None:
-            _TYPECLASS = class_from_module(settings.BASE_FACTION_TYPECLASS)
-        return _TYPECLASS
+        return faction_class()
 
     def prepare(self) -> bool:
-        if not hasattr(self.accessing_obj, "at_post_puppet"):
+        if not isinstance(self.accessing_obj, ObjectDB):
             return False
 
         if not self.path:
-            return hasattr(self.accessed_obj, "is_member")
+            if isinstance(self.accessed_obj, FactionDB):
+                self.faction = self.accessed_obj
+            return self.faction is not None
+
+        # A room full of objects locked to the same faction would otherwise look it up once
+        # per object, so lookups (including misses) are remembered for the rest of the command.
+        cache = turn_cache(self.accessing_obj, "lock_paths")
+        if self.path in cache:
+            self.faction = cache[self.path]
+            return self.faction is not None
 
         op = Operation(
             user=self.accessing_obj.account,
@@ -39,7 +44,7 @@ class _LockFunctionHelper:
         )
         op.execute()
 
-        self.faction = op.results.get("faction", None)
+        self.faction = cache[self.path] = op.results.get("faction", None)
 
         return self.faction is not None
 
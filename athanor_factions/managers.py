@@ -1,21 +1,90 @@
-from django.db import models
+import csv
+import functools
+import io
+import json
+
+from django.db import connections, models, transaction
+from django.db.models import CharField, Max, Prefetch, ProtectedError, Q, Value
+from django.db.models.functions import Concat, Length, Lower, Substr
 from django.conf import settings
 import evennia
 from evennia.typeclasses.managers import TypeclassManager, TypedObjectManager
 from evennia.utils import class_from_module
-from athanor.utils import Operation, partial_match, validate_name, staff_alert
+from evennia.utils.utils import delay
+from athanor.utils import Operation, validate_name, staff_alert
+
+from .utils import turn_cache, prefix_match
+
+
+# Parsed forms of the admin lockstrings, keyed by the raw string.
+_PARSED_LOCKSTRINGS = dict()
+
+
+@functools.cache
+def faction_class():
+    """
+    Returns the class at settings.BASE_FACTION_TYPECLASS, imported once per process.
+    """
+    return class_from_module(settings.BASE_FACTION_TYPECLASS)
 
 
 class FactionDBManager(TypedObjectManager):
     system_name = "FACTION"
 
+    def _all_factions(self):
+        """
+        The manager for every Faction regardless of typeclass. A Faction's parent, children
+        and descendants can each be a different typeclass, and TypeclassManager would only
+        see those matching this manager's model, so tree-wide reads and writes go through here.
+        """
+        return self.model.__dbclass__.objects
+
+    def _faction_tree(self, operation: Operation) -> dict:
+        """
+        Returns every Faction grouped by parent id, as {parent_id: ({lowered key: faction}, sorted keys)}.
+        The table is read in one query and kept on the Operation, so walking a path costs a
+        single round-trip however deep it goes, and ops that resolve several paths share it.
+        """
+        if (tree := getattr(operation, "_faction_tree", None)) is None:
+            children = dict()
+            for faction in self._all_factions().list_light():
+                children.setdefault(faction.db_parent_id, dict())[faction.key.lower()] = faction
+            tree = {parent_id: (by_key, sorted(by_key)) for parent_id, by_key in children.items()}
+            operation._faction_tree = tree
+        return tree
+
+    @staticmethod
+    def _match_child(choices: tuple, match_text: str):
+        """
+        partial_match() for a _faction_tree() entry: exact matches are a dict lookup and
+        abbreviations are a binary search over the sorted keys.
+        """
+        by_key, sorted_keys = choices
+        match_text = match_text.lower()
+        if (found := by_key.get(match_text, None)) is not None:
+            return found
+        if (found := prefix_match(match_text, sorted_keys)) is not None:
+            return by_key[found]
+        return None
+
     def find_faction(self, operation: Operation, key: str = "faction"):
-        if (input := operation.kwargs.get(key, None)) is None:
+        return self.resolve_faction(operation, operation.kwargs.get(key, None))
+
+    def resolve_faction(self, operation: Operation, input):
+        """
+        Turns a Faction, a Faction ID, or a Faction path into a Faction, raising
+        operation.ex() if that can't be done.
+        """
+        if input is None:
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("You must provide a Faction ID or Path/Name.")
 
         if isinstance(input, self.model):
             faction = input
+        elif isinstance(input, str) and (faction := self._all_factions().alias(
+                lower_path=Lower("db_full_path")).filter(lower_path=input.lower()).first()) is not None:
+            # A full, unabbreviated path is one indexed lookup; only abbreviations need the tree.
+            pass
         elif isinstance(input, str):
             path = input.split("/")
             if not len(path):
@@ -25,22 +94,22 @@ class FactionDBManager(TypedObjectManager):
             start_check = path[0]
             rest = path[1:]
 
-            choices = self.filter(db_parent=None)
-            if not choices:
+            tree = self._faction_tree(operation)
+
+            if not (choices := tree.get(None, None)):
                 operation.status = operation.st.HTTP_404_NOT_FOUND
                 raise operation.ex("No Factions found.")
-            if not (choice := partial_match(start_check, choices)):
+            if not (choice := self._match_child(choices, start_check)):
                 operation.status = operation.st.HTTP_404_NOT_FOUND
                 raise operation.ex(f"No Faction found called: {start_check}")
 
             while rest:
                 start_check = rest[0]
                 rest = rest[1:]
-                choices = choice.children.all()
-                if not choices:
+                if not (choices := tree.get(choice.id, None)):
                     operation.status = operation.st.HTTP_404_NOT_FOUND
                     raise operation.ex(f"No Factions found under: {start_check}")
-                if not (new_choice := partial_match(start_check, choices)):
+                if not (new_choice := self._match_child(choices, start_check)):
                     operation.status = operation.st.HTTP_404_NOT_FOUND
                     raise operation.ex(f"No Faction found under {choice.full_path()} called: {start_check}")
                 choice = new_choice
@@ -48,7 +117,11 @@ class FactionDBManager(TypedObjectManager):
                 faction = choice
 
         elif isinstance(input, int):
-            faction = self.filter(id=input).first()
+            # The idmapper already holds every recently-used Faction, and keeps itself
+            # coherent on save/delete; only go to the database when it doesn't have this one.
+            faction = self.model.get_cached_instance(input)
+            if not isinstance(faction, self.model):
+                faction = self.filter(id=input).first()
             if faction is None:
                 operation.status = operation.st.HTTP_404_NOT_FOUND
                 raise operation.ex("No Faction found with that ID.")
@@ -66,13 +139,120 @@ class FactionDBManager(TypedObjectManager):
         faction = self.find_faction(operation)
         operation.results = {"success": True, "faction": faction}
 
+    def _check_lockstring(self, accessing_obj, lockstring: str) -> bool:
+        cache = turn_cache(accessing_obj, "lockstrings")
+        if (result := cache.get(lockstring, None)) is None:
+            result = cache[lockstring] = self._eval_lockstring(accessing_obj, lockstring)
+        return result
+
+    @staticmethod
+    def _eval_lockstring(accessing_obj, lockstring: str) -> bool:
+        """
+        Does what LockHandler.check_lockstring() does, except the lockstring is only
+        parsed the first time it's seen instead of on every check.
+        """
+        handler = accessing_obj.locks
+        if not (hasattr(handler, "_parse_lockstring") and hasattr(handler, "_eval_access_type")):
+            # Those are LockHandler internals; without them, take the uncached public route.
+            return handler.check_lockstring(accessing_obj, lockstring)
+        if handler.lock_bypass:
+            return True
+        if (locks := _PARSED_LOCKSTRINGS.get(lockstring, None)) is None:
+            locks = _PARSED_LOCKSTRINGS[lockstring] = handler._parse_lockstring(
+                lockstring if ":" in lockstring else f"_dummy:{lockstring}")
+        if not locks:
+            return False
+        # As in check_lockstring(), every access type in the string must pass.
+        return all(handler._eval_access_type(accessing_obj, locks, access_type) for access_type in locks)
+
     def check_override(self, accessing_obj):
-        return accessing_obj.locks.check_lockstring(accessing_obj, settings.FACTION_PERMISSIONS_ADMIN_OVERRIDE)
+        return self._check_lockstring(accessing_obj, settings.FACTION_PERMISSIONS_ADMIN_OVERRIDE)
 
     def check_admin(self, accessing_obj):
-        return (accessing_obj.locks.check_lockstring(accessing_obj, settings.FACTION_PERMISSIONS_ADMIN_MEMBERSHIP) or
+        return (self._check_lockstring(accessing_obj, settings.FACTION_PERMISSIONS_ADMIN_MEMBERSHIP) or
                 self.check_override(accessing_obj))
 
+    def is_related_in_tree(self, a, b) -> str:
+        """
+        Says how Faction a relates to Faction b: "ancestor" if a is above b, "descendant"
+        if it is below, otherwise "none". Read from the materialized paths, so no query.
+        """
+        a_path, b_path = a.full_path(), b.full_path()
+        if b_path.startswith(f"{a_path}/"):
+            return "ancestor"
+        if a_path.startswith(f"{b_path}/"):
+            return "descendant"
+        return "none"
+
+    def list_light(self):
+        """
+        Factions without their stored roster, which path walks and listings never read.
+        """
+        return self.get_queryset().defer("db_roster_cache")
+
+    def roster(self, faction) -> list[dict]:
+        """
+        Returns a Faction's stored roster. Factions loaded through list_light() don't have
+        it yet; for those it is fetched with one single-column query and kept on the instance.
+        """
+        if "db_roster_cache" in faction.get_deferred_fields():
+            faction.db_roster_cache = self._all_factions().filter(id=faction.id).values_list(
+                "db_roster_cache", flat=True).first() or list()
+        return faction.db_roster_cache
+
+    def rebuild_roster(self, faction_id):
+        """
+        Rewrites a Faction's stored roster, the serialize() dicts of all its Members,
+        with one UPDATE, and patches the idmapper's copy of the Faction to match.
+        """
+        from .models import Member
+
+        roster = Member.serialize_many(Member.objects.filter(faction_id=faction_id))
+        self._all_factions().filter(id=faction_id).update(db_roster_cache=roster)
+        if cached := self.model.__dbclass__.get_cached_instance(faction_id):
+            cached.db_roster_cache = roster
+        return roster
+
+    def update_path(self, faction):
+        """
+        Recalculates a Faction's materialized path from its parent and key, then
+        rewrites the paths of all of its descendants with a single UPDATE.
+        """
+        old_path = faction.db_full_path
+        parent = faction.parent
+        new_path = f"{parent.db_full_path}/{faction.key}" if parent else faction.key
+        faction.db_full_path = new_path
+        if not old_path or old_path == new_path:
+            faction.save(update_fields=["db_full_path"])
+            return
+
+        old_prefix, new_prefix = f"{old_path}/", f"{new_path}/"
+        with transaction.atomic():
+            faction.save(update_fields=["db_full_path"])
+            self._all_factions().filter(db_full_path__startswith=old_prefix).update(
+                db_full_path=Concat(Value(new_prefix), Substr("db_full_path", len(old_prefix) + 1))
+            )
+        # The idmapper keeps instances alive between queries, so those need patching too.
+        for cached in self.model.get_all_cached_instances():
+            if cached.db_full_path.startswith(old_prefix):
+                cached.db_full_path = new_prefix + cached.db_full_path[len(old_prefix):]
+
+    def _check_path_length(self, operation: Operation, new_path: str, faction=None):
+        """
+        Raises operation.ex() if new_path, or the path of any of faction's descendants once
+        moved under it, would not fit in db_full_path.
+        """
+        limit = self.model._meta.get_field("db_full_path").max_length
+        longest = len(new_path)
+        if faction is not None and (old_path := faction.db_full_path):
+            deepest = self._all_factions().filter(db_full_path__startswith=f"{old_path}/").aggregate(
+                longest=Max(Length("db_full_path")))["longest"]
+            if deepest:
+                longest = max(longest, deepest - len(old_path) + len(new_path))
+        if longest > limit:
+            operation.status = operation.st.HTTP_400_BAD_REQUEST
+            raise operation.ex(f"That would make a Faction path longer than {limit} characters.")
+
     def _validate_name(self, operation: Operation, key="name"):
         if not (
                 name := validate_name(
@@ -94,15 +274,20 @@ class FactionDBManager(TypedObjectManager):
         if "parent" in operation.kwargs:
             parent = self.find_faction(operation, key="parent")
 
-        if exists := self.filter(db_key__iexact=name, db_parent=parent).first():
+        if exists := (self.filter(db_parent=parent).alias(lower_key=Lower("db_key"))
+                          .filter(lower_key=name.lower()).first()):
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex(f"A Faction already exists with that name: {exists}")
 
-        faction = self.create(db_key=name, db_parent=parent)
+        self._check_path_length(operation, f"{parent.db_full_path}/{name}" if parent else name)
+
+        # at_first_save() writes the new Faction's path; it belongs with the INSERT.
+        with transaction.atomic():
+            faction = self.create(db_key=name, db_parent=parent)
 
         message = f"A new Faction was created: {faction.full_path()}."
         operation.results = {"success": True, "faction": faction, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
     def op_rename(self, operation: Operation):
         if not self.check_override(operation.actor):
@@ -113,14 +298,21 @@ class FactionDBManager(TypedObjectManager):
 
         name = self._validate_name(operation)
 
-        if conflict := self.filter(db_parent=faction.parent, db_key__iexact=name).exclude(id=faction).first():
+        if conflict := (self.filter(db_parent=faction.parent).alias(lower_key=Lower("db_key"))
+                            .filter(lower_key=name.lower()).exclude(id=faction).first()):
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex(f"A Faction already exists with that name: {conflict}")
 
+        parent = faction.parent
+        self._check_path_length(operation, f"{parent.db_full_path}/{name}" if parent else name, faction)
+
         message = f"{faction.full_path()} was renamed to: {name}."
-        faction.key = name
+        # The key, the Faction's own path and its descendants' paths all change together or not at all.
+        with transaction.atomic():
+            faction.key = name
+            self.update_path(faction)
         operation.results = {"success": True, "faction": faction, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
     def op_parent(self, operation: Operation):
         if not self.check_override(operation.actor):
@@ -133,27 +325,27 @@ class FactionDBManager(TypedObjectManager):
         if parent == "/":
             parent = None
         else:
-            parent = self.find_faction(operation, key="parent")
+            parent = self.resolve_faction(operation, parent)
 
         if parent == faction:
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("A Faction cannot be its own parent.")
 
-        if parent and faction in parent.ancestors():
+        if parent and self.is_related_in_tree(faction, parent) == "ancestor":
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("A Faction cannot be its own ancestor.")
 
-        if faction.contains_sub_faction(parent):
-            operation.status = operation.st.HTTP_400_BAD_REQUEST
-            raise operation.ex("A Faction cannot be its own descendant.")
+        self._check_path_length(operation, f"{parent.db_full_path}/{faction.key}" if parent else faction.key, faction)
 
         old_path = faction.full_path()
-        old_parent = faction.parent
-        faction.parent = parent
+        # As in op_rename, the parent change commits with update_path()'s writes.
+        with transaction.atomic():
+            faction.parent = parent
+            self.update_path(faction)
         new_path = faction.full_path()
         message = f"{old_path} was moved to {new_path}."
         operation.results = {"success": True, "faction": faction, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
     def op_config_set(self, operation: Operation):
         faction = self.find_faction(operation)
@@ -184,18 +376,17 @@ class FactionDBManager(TypedObjectManager):
             operation.status = operation.st.HTTP_403_FORBIDDEN
             raise operation.ex("You do not have permission to configure this Faction.")
 
-        config = faction.options.all(return_objs=True)
-
-        out = list()
-        for op in config:
-            out.append(
-                {
-                    "name": op.key,
-                    "description": op.description,
-                    "type": op.__class__.__name__,
-                    "value": str(op.display()),
-                }
-            )
+        # The options handler loads every option Attribute in one query when it is first
+        # built, so walking all of them here never goes back to the database.
+        out = [
+            {
+                "name": op.key,
+                "description": op.description,
+                "type": op.__class__.__name__,
+                "value": str(op.display()),
+            }
+            for op in faction.options.all(return_objs=True)
+        ]
 
         operation.results = {
             "success": True,
@@ -208,9 +399,40 @@ class FactionDBManager(TypedObjectManager):
         if "faction" in operation.kwargs:
             faction = self.find_faction(operation, key="faction")
 
-        root_factions = self.filter(db_parent=faction)
-        factions = [f.serialize(include_children=True) for f in root_factions]
-        operation.results = {"success": True, "factions": factions}
+        operation.results = {"success": True, "factions": self.serialize_tree(faction)}
+
+    def with_roster(self):
+        """
+        Factions with their Ranks (in number order), each Rank's Members and those
+        Members' Characters prefetched: three queries however many Ranks there are.
+        """
+        from .models import Rank, Member
+
+        members = Member.objects.select_related("character")
+        ranks = Rank.objects.order_by("number").prefetch_related(Prefetch("holders", queryset=members))
+        return self.prefetch_related(Prefetch("ranks", queryset=ranks))
+
+    def serialize_tree(self, root=None) -> list[dict]:
+        """
+        Serializes every live Faction beneath root (or the whole tree, if None) as nested
+        {"id", "key", "children"} dicts. The rows come back from one values() query and
+        are stitched together by parent id; descendants of a deleted Faction never find
+        their parent, so they're left out too.
+        """
+        queryset = self._all_factions().filter(db_deleted=False)
+        if root is not None:
+            queryset = queryset.filter(db_full_path__startswith=f"{root.full_path()}/")
+        rows = list(queryset.values("id", "db_key", "db_parent_id"))
+
+        root_id = root.id if root is not None else None
+        nodes = {row["id"]: {"id": row["id"], "key": row["db_key"], "children": list()} for row in rows}
+        out = list()
+        for row in rows:
+            if row["db_parent_id"] == root_id:
+                out.append(nodes[row["id"]])
+            elif parent := nodes.get(row["db_parent_id"], None):
+                parent["children"].append(nodes[row["id"]])
+        return out
 
 
 class FactionManager(FactionDBManager, TypeclassManager):
@@ -220,9 +442,39 @@ class FactionManager(FactionDBManager, TypeclassManager):
 class RankManager(models.Manager):
     system_name = "FACTION"
 
+    def with_related(self):
+        """
+        Ranks with their Faction joined in, which repr() needs.
+        """
+        return self.get_queryset().select_related("faction")
+
+    def list_light(self):
+        """
+        Ranks without their data payload, for listings that only show names and numbers.
+        """
+        return self.get_queryset().defer("data")
+
+    def safe_delete(self, queryset):
+        """
+        Deletes the given Ranks, raising ProtectedError without deleting anything if any
+        of them still has Members. All of them are checked with one query.
+        """
+        if held := list(queryset.filter(holders__isnull=False).distinct()):
+            raise ProtectedError("Cannot delete Ranks that still have Members.", held)
+        return queryset.delete()
+
+    def bulk_create_default(self, faction, specs):
+        """
+        Creates a Faction's Ranks from a list of {"name", "number", "data"} dicts in one INSERT.
+        """
+        return self.bulk_create(
+            [self.model(faction=faction, name=s["name"], number=s["number"], data=s.get("data", dict()))
+             for s in specs],
+            batch_size=500,
+        )
+
     def find_faction(self, operation: Operation, key="faction"):
-        f = class_from_module(settings.BASE_FACTION_TYPECLASS)
-        return f.objects.find_faction(operation, key=key)
+        return faction_class().objects.find_faction(operation, key=key)
 
     def _validate_name(self, operation: Operation, key="name"):
         if not (
@@ -254,14 +506,14 @@ class RankManager(models.Manager):
             raise operation.ex("You do not have permission to create Ranks.")
 
         rank = self._validate_rank(operation)
+        name = self._validate_name(operation)
 
-        if faction.ranks.filter(number=rank).first():
+        # Both conflicts are found with one query; a number clash is reported first.
+        conflicts = list(faction.ranks.filter(Q(number=rank) | Q(name__iexact=name)).values("number", "name"))
+        if any(c["number"] == rank for c in conflicts):
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("A Rank already exists with that number.")
-
-        name = self._validate_name(operation)
-
-        if faction.ranks.filter(name__iexact=name).first():
+        if conflicts:
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("A Rank already exists with that name.")
 
@@ -269,12 +521,12 @@ class RankManager(models.Manager):
 
         message = f"Rank {new_rank.number} '{new_rank.name}' created for {faction.full_path()}."
         operation.results = {"success": True, "faction": faction, "rank": new_rank, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
     def op_list(self, operation: Operation):
         faction = self.find_faction(operation)
-        ranks = faction.ranks.all()
-        operation.results = {"success": True, "faction": faction, "ranks": [r.serialize() for r in ranks]}
+        ranks = self.model.serialize_many(faction.ranks.order_by("number"))
+        operation.results = {"success": True, "faction": faction, "ranks": ranks}
 
     def find_rank(self, operation: Operation, faction):
         rank = self._validate_rank(operation)
@@ -289,19 +541,24 @@ class RankManager(models.Manager):
             operation.status = operation.st.HTTP_403_FORBIDDEN
             raise operation.ex("You do not have permission to rename Ranks.")
 
-        rank = self.find_rank(operation, faction)
-
+        number = self._validate_rank(operation)
         name = self._validate_name(operation)
 
-        if conflict := faction.ranks.filter(name__iexact=name).exclude(id=rank).first():
+        # The target Rank and any Rank already using the new name come back together.
+        found = list(faction.ranks.filter(Q(number=number) | Q(name__iexact=name)))
+        if not (rank := next((r for r in found if r.number == number), None)):
+            operation.status = operation.st.HTTP_400_BAD_REQUEST
+            raise operation.ex("No Rank found with that number.")
+
+        if conflict := next((r for r in found if r.id != rank.id), None):
             operation.status = operation.st.HTTP_400_BAD_REQUEST
-            raise operation.ex(f"A Rank already exists with that name: {conflict}")
+            raise operation.ex(f"A Rank already exists with that name: {conflict.name}")
 
         message = f"Rank {rank.number} '{rank.name}' renamed to '{name}'."
         rank.name = name
-        rank.save()
+        rank.save(update_fields=["name"])
         operation.results = {"success": True, "faction": faction, "rank": rank, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
     def op_number(self, operation: Operation):
         faction = self.find_faction(operation)
@@ -309,19 +566,27 @@ class RankManager(models.Manager):
             operation.status = operation.st.HTTP_403_FORBIDDEN
             raise operation.ex("You do not have permission to renumber Ranks.")
 
-        rank = self.find_rank(operation, faction)
-
+        number = self._validate_rank(operation)
         new_rank = self._validate_rank(operation, key="new_number")
 
-        if faction.ranks.filter(number=new_rank).first():
+        # The target Rank and any Rank already holding the new number come back together.
+        found = {r.number: r for r in faction.ranks.filter(number__in=(number, new_rank))}
+        if not (rank := found.get(number, None)):
+            operation.status = operation.st.HTTP_400_BAD_REQUEST
+            raise operation.ex("No Rank found with that number.")
+
+        if new_rank in found:
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("A Rank already exists with that number.")
 
         message = f"Rank {rank.number} '{rank.name}' renumbered to '{new_rank}'."
-        rank.number = new_rank
-        rank.save()
+        # The Rank's post_save handler copies the new number onto its holders; the
+        # transaction keeps the two from disagreeing if either write fails.
+        with transaction.atomic():
+            rank.number = new_rank
+            rank.save(update_fields=["number"])
         operation.results = {"success": True, "faction": faction, "rank": rank, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
     def op_delete(self, operation: Operation):
         faction = self.find_faction(operation)
@@ -335,14 +600,14 @@ class RankManager(models.Manager):
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("You cannot delete the first two Ranks.")
 
-        if rank.holders.count():
+        message = f"Rank {rank.number} '{rank.name}' deleted."
+        try:
+            self.safe_delete(faction.ranks.filter(id=rank.id))
+        except ProtectedError:
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("You cannot delete a Rank that has Members.")
-
-        message = f"Rank {rank.number} '{rank.name}' deleted."
-        rank.delete()
         operation.results = {"success": True, "faction": faction, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
     def op_permissions(self, operation: Operation):
         faction = self.find_faction(operation)
@@ -363,18 +628,103 @@ class RankManager(models.Manager):
             raise operation.ex(str(err))
 
         rank.data["permissions"] = permissions
-        rank.save()
+        rank.save(update_fields=["data"])
         message = f"Rank {rank.number} '{rank.name}' permissions set to '{permissions}'."
         operation.results = {"success": True, "faction": faction, "rank": rank, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
 
 class MemberManager(models.Manager):
     system_name = "FACTION"
 
+    def with_related(self):
+        """
+        Members with their Character, Rank and Faction joined in, which serialize()
+        and repr() need.
+        """
+        return self.get_queryset().select_related("rank__faction", "character")
+
+    def copy_load(self, rows) -> int:
+        """
+        Loads an iterable of (rank_id, character_id, data) tuples as Members, for world
+        seeding and imports, and returns how many were loaded. On PostgreSQL they are
+        streamed in with a single COPY (psycopg2's copy_expert() or psycopg 3's copy());
+        other backends fall back to bulk_create(). Neither runs save() or signals, so the
+        affected rosters are rebuilt afterwards.
+
+        Raises ValueError, before loading anything, if any rank_id doesn't exist.
+        """
+        rows = list(rows)
+        rank_model = self.model._meta.get_field("rank").related_model
+        ranks = {r["id"]: r for r in rank_model.objects.filter(
+            id__in={row[0] for row in rows}).values("id", "faction_id", "number")}
+        if missing := sorted({row[0] for row in rows} - ranks.keys()):
+            raise ValueError(f"No Ranks found with ids: {', '.join(str(m) for m in missing)}")
+        records = [(rank_id, ranks[rank_id]["faction_id"], ranks[rank_id]["number"], character_id, data or dict())
+                   for rank_id, character_id, data in rows]
+
+        connection = connections[self.db]
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql" and (hasattr(cursor, "copy_expert") or hasattr(cursor, "copy")):
+                self._copy_records(cursor, records)
+            else:
+                self.bulk_create(
+                    [self.model(rank_id=r[0], faction_id=r[1], rank_number=r[2], character_id=r[3], data=r[4])
+                     for r in records],
+                    batch_size=500,
+                )
+
+        for faction_id in {r[1] for r in records}:
+            faction_class().objects.rebuild_roster(faction_id)
+        return len(records)
+
+    def _copy_records(self, cursor, records):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for rank_id, faction_id, number, character_id, data in records:
+            writer.writerow((rank_id, faction_id, number, character_id, json.dumps(data)))
+        # The id column is left to its sequence default, so no setval() is needed afterwards.
+        sql = (f"COPY {self.model._meta.db_table} (rank_id, faction_id, rank_number, character_id, data) "
+               f"FROM STDIN WITH CSV")
+        if hasattr(cursor, "copy_expert"):
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+        else:
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+    def list_light(self):
+        """
+        Members without their own or their Rank's data payload, for listings that only
+        need who holds which Rank.
+        """
+        return self.get_queryset().select_related("rank").defer("data", "rank__data")
+
+    def stream_serialized(self, queryset=None, chunk: int = 2000):
+        """
+        Yields the same dicts as Member.serialize(), reading chunk rows at a time so
+        dumping a huge roster never holds all of it in memory.
+        """
+        queryset = self.get_queryset() if queryset is None else queryset
+        for row in queryset.values(*self.model.serialize_fields).iterator(chunk_size=chunk):
+            yield self.model.serialize_row(row)
+
+    def bulk_add(self, rank, characters):
+        """
+        Makes every Character given a Member at the given Rank in one INSERT.
+        """
+        # bulk_create() skips save() and its signals, so the copied Rank columns are
+        # filled in here and the roster is rebuilt by hand.
+        created = self.bulk_create(
+            [self.model(rank=rank, faction_id=rank.faction_id, rank_number=rank.number, character=c)
+             for c in characters],
+            batch_size=500,
+        )
+        faction_class().objects.rebuild_roster(rank.faction_id)
+        return created
+
     def find_faction(self, operation: Operation, key="faction"):
-        f = class_from_module(settings.BASE_FACTION_TYPECLASS)
-        return f.objects.find_faction(operation, key=key)
+        return faction_class().objects.find_faction(operation, key=key)
 
     def _validate_rank(self, operation: Operation, key="rank"):
         if not (
@@ -391,7 +741,7 @@ class MemberManager(models.Manager):
 
     def find_rank(self, operation: Operation, faction, key="rank"):
         rank = self._validate_rank(operation, key=key)
-        rank = faction.ranks.filter(number=rank).first()
+        rank = faction.ranks.list_light().filter(number=rank).first()
         if not rank:
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("No Rank found with that number.")
@@ -399,8 +749,7 @@ class MemberManager(models.Manager):
 
     def op_list(self, operation: Operation):
         faction = self.find_faction(operation)
-        members = faction.members.all()
-        operation.results = {"success": True, "faction": faction, "members": [m.serialize() for m in members]}
+        operation.results = {"success": True, "faction": faction, "members": faction_class().objects.roster(faction)}
 
     def find_character(self, operation: Operation, key="character"):
         if not (character := operation.kwargs.get(key, None)):
@@ -411,9 +760,41 @@ class MemberManager(models.Manager):
             raise operation.ex("You must provide a Character.")
         return character
 
+    def _resolve_member(self, operation: Operation, permission, error: str):
+        """
+        Shared start of the ops that act on a single Member: finds the Faction and the
+        Character, loads the actor's and the target's Member rows with one query and
+        checks the actor's permission against them. A permission of None means only
+        leaders may act.
+
+        Returns (faction, character, actor's rank number, target Member).
+        """
+        faction = self.find_faction(operation)
+        character = self.find_character(operation)
+        actor = operation.character
+
+        members = {m.character_id: m for m in self.filter(
+            faction=faction, character__in=[actor, character]).select_related("rank")}
+
+        if faction.__class__.objects.check_admin(actor):
+            actor_rank = 0
+        elif (actor_member := members.get(actor.id)) and (
+                actor_member.rank.number <= 1
+                or (permission and permission in faction.member_permissions(actor_member))):
+            actor_rank = actor_member.rank.number
+        else:
+            operation.status = operation.st.HTTP_403_FORBIDDEN
+            raise operation.ex(error)
+
+        if not (member := members.get(character.id)):
+            operation.status = operation.st.HTTP_400_BAD_REQUEST
+            raise operation.ex("That Character is not a Member.")
+
+        return faction, character, actor_rank, member
+
     def op_add(self, operation: Operation):
         faction = self.find_faction(operation)
-        if not faction.__class_.objects.check_admin(operation.character):
+        if not faction.__class__.objects.check_admin(operation.character):
             operation.status = operation.st.HTTP_403_FORBIDDEN
             raise operation.ex("You do not have permission to add Members.")
 
@@ -431,7 +812,7 @@ class MemberManager(models.Manager):
 
         rank = self.find_rank(operation, faction)
 
-        if faction.members.filter(character=character).first():
+        if faction.members.filter(character=character).exists():
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("That Character is already a Member.")
 
@@ -439,47 +820,26 @@ class MemberManager(models.Manager):
 
         message = f"{character} added to {faction.full_path()} as Rank {rank.number} '{rank.name}'."
         operation.results = {"success": True, "faction": faction, "character": character, "rank": rank, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
     def op_remove(self, operation: Operation):
-        faction = self.find_faction(operation)
-        if not faction.has_permission(operation.character, "roster"):
-            operation.status = operation.st.HTTP_403_FORBIDDEN
-            raise operation.ex("You do not have permission to remove Members.")
-
-        character = self.find_character("character")
-
-        if not (member := faction.members.filter(character=character).first()):
-            operation.status = operation.st.HTTP_400_BAD_REQUEST
-            raise operation.ex("That Character is not a Member.")
-
-        rank = faction.get_effective_rank(operation.character)
-        if rank.number > member.rank.number:
+        faction, character, rank, member = self._resolve_member(
+            operation, "roster", "You do not have permission to remove Members.")
+        if rank > member.rank.number:
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("You cannot remove a Member of equal or higher Rank.")
 
         message = f"{character} removed from {faction.full_path()}."
         member.delete()
         operation.results = {"success": True, "faction": faction, "character": character, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
     def op_rank(self, operation: Operation):
-        faction = self.find_faction(operation)
-        if not faction.has_permission(operation.character, "roster"):
-            operation.status = operation.st.HTTP_403_FORBIDDEN
-            raise operation.ex("You do not have permission to promote Members.")
-
-        character = self.find_character("character")
-
-        if not (member := faction.members.filter(character=character).first()):
-            operation.status = operation.st.HTTP_400_BAD_REQUEST
-            raise operation.ex("That Character is not a Member.")
-
+        faction, character, actor_rank, member = self._resolve_member(
+            operation, "roster", "You do not have permission to promote Members.")
         rank = self.find_rank(operation, faction)
 
-        actor_rank = faction.get_effective_rank(operation.character)
-
-        if actor_rank.number > member.rank.number:
+        if actor_rank > member.rank.number:
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("You cannot promote a Member of equal or higher Rank.")
 
@@ -489,21 +849,13 @@ class MemberManager(models.Manager):
 
         message = f"{character} promoted to Rank {rank.number} '{rank.name}' in {faction.full_path()}."
         member.rank = rank
-        member.save()
+        member.save(update_fields=["rank"])
         operation.results = {"success": True, "faction": faction, "character": character, "rank": rank, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
     def op_permissions(self, operation: Operation):
-        faction = self.find_faction(operation)
-        if not faction.is_leader(operation.character):
-            operation.status = operation.st.HTTP_403_FORBIDDEN
-            raise operation.ex("You do not have permission to alter Member permissions.")
-
-        character = self.find_character("character")
-
-        if not (member := faction.members.filter(character=character).first()):
-            operation.status = operation.st.HTTP_400_BAD_REQUEST
-            raise operation.ex("That Character is not a Member.")
+        faction, character, _, member = self._resolve_member(
+            operation, None, "You do not have permission to alter Member permissions.")
 
         if not (perm := operation.kwargs.get("permissions", None)):
             operation.status = operation.st.HTTP_400_BAD_REQUEST
@@ -516,29 +868,19 @@ class MemberManager(models.Manager):
             raise operation.ex(str(err))
 
         member.data["permissions"] = permissions
-        member.save()
+        member.save(update_fields=["data"])
         message = f"{character} permissions set to '{permissions}' for {faction.full_path()}."
         operation.results = {"success": True, "faction": faction, "character": character, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
     def op_title(self, operation: Operation):
         """
         Sets the title of a Member.
         This is stored in their .data["title"] attribute.
         """
-        faction = self.find_faction(operation)
-        if not faction.has_permission(operation.character, "roster"):
-            operation.status = operation.st.HTTP_403_FORBIDDEN
-            raise operation.ex("You do not have permission to set Member titles.")
-
-        character = self.find_character("character")
-
-        if not (member := faction.members.filter(character=character).first()):
-            operation.status = operation.st.HTTP_400_BAD_REQUEST
-            raise operation.ex("That Character is not a Member.")
-
-        my_rank = faction.get_effective_rank(operation.character)
-        if (my_rank.number >= member.rank.number) and not (operation.character == member.character):
+        faction, character, my_rank, member = self._resolve_member(
+            operation, "roster", "You do not have permission to set Member titles.")
+        if (my_rank >= member.rank.number) and not (operation.character == character):
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("You cannot set the title of a Member of equal or higher Rank.")
 
@@ -547,18 +889,17 @@ class MemberManager(models.Manager):
             raise operation.ex("You must provide a title.")
 
         member.data["title"] = title
-        member.save()
+        member.save(update_fields=["data"])
         message = f"{character} title set to '{title}' for {faction.full_path()}."
         operation.results = {"success": True, "faction": faction, "character": character, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
 
 class InvitationManager(models.Manager):
     system_name = "FACTION"
 
     def find_faction(self, operation: Operation, key="faction"):
-        f = class_from_module(settings.BASE_FACTION_TYPECLASS)
-        return f.objects.find_faction(operation, key=key)
+        return faction_class().objects.find_faction(operation, key=key)
 
     def find_character(self, operation: Operation, key="character"):
         if not (character := operation.kwargs.get(key, None)):
@@ -569,6 +910,18 @@ class InvitationManager(models.Manager):
             raise operation.ex("You must provide a Character.")
         return character
 
+    def bulk_invite(self, faction, characters, inviter):
+        """
+        Invites every Character given to the Faction in one INSERT. Anyone already invited
+        has their Invitation's inviter updated instead, so repeating a call is harmless.
+        """
+        return self.bulk_create(
+            [self.model(faction=faction, character=c, inviter=inviter) for c in characters],
+            update_conflicts=True,
+            unique_fields=["character", "faction"],
+            update_fields=["inviter"],
+        )
+
     def op_extend(self, operation: Operation):
         faction = self.find_faction(operation)
         if not faction.has_permission(operation.character, "invite"):
@@ -577,20 +930,29 @@ class InvitationManager(models.Manager):
 
         character = self.find_character(operation)
 
-        if faction.members.filter(character=character).first():
+        # One UNION query says whether they are already a Member, already invited, or both.
+        found = set(
+            faction.members.filter(character=character).order_by()
+            .values_list(Value("member", output_field=CharField()), flat=True)
+            .union(faction.invitations.filter(character=character).order_by()
+                   .values_list(Value("invitation", output_field=CharField()), flat=True))
+        )
+
+        if "member" in found:
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("That Character is already a Member.")
 
-        if faction.invitations.filter(character=character).first():
+        if "invitation" in found:
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("That Character already has an Invitation.")
 
-        faction.invitations.create(character=character)
+        faction.invitations.create(character=character, inviter=operation.character)
 
-        message = f"{character} invited to {faction.full_path()}."
-        character.msg(f"You have been invited to join {faction.full_path()}. help fiaccept for more information.")
+        path = faction.full_path()
+        message = f"{character} invited to {path}."
+        delay(0, character.msg, f"You have been invited to join {path}. help fiaccept for more information.")
         operation.results = {"success": True, "faction": faction, "character": character, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
     def op_rescind(self, operation: Operation):
         faction = self.find_faction(operation)
@@ -604,41 +966,45 @@ class InvitationManager(models.Manager):
             operation.status = operation.st.HTTP_400_BAD_REQUEST
             raise operation.ex("That Character does not have an Invitation.")
 
-        message = f"{character} invitation to {faction.full_path()} rescinded."
+        path = faction.full_path()
+        message = f"{character} invitation to {path} rescinded."
         invitation.delete()
-        character.msg(f"Your invitation to join {faction.full_path()} has been rescinded.")
+        delay(0, character.msg, f"Your invitation to join {path} has been rescinded.")
         operation.results = {"success": True, "faction": faction, "character": character, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
     def op_list(self, operation: Operation):
         faction = self.find_faction(operation)
-        invitations = faction.invitations.all()
-        operation.results = {"success": True, "faction": faction, "invitations": [i.serialize() for i in invitations]}
+        invitations = self.model.serialize_many(faction.invitations.all())
+        operation.results = {"success": True, "faction": faction, "invitations": invitations}
 
     def op_accept(self, operation: Operation):
         faction = self.find_faction(operation)
         character = operation.character
+        start_rank = faction.options.get("start_rank")
 
-        if not (invitation := faction.invitations.filter(character=character).first()):
-            operation.status = operation.st.HTTP_400_BAD_REQUEST
-            raise operation.ex("You do not have an Invitation to that Faction.")
+        # Locking the Invitation keeps a second accept from racing this one into a duplicate Member.
+        with transaction.atomic():
+            if not (invitation := faction.invitations.select_for_update().filter(character=character).first()):
+                operation.status = operation.st.HTTP_400_BAD_REQUEST
+                raise operation.ex("You do not have an Invitation to that Faction.")
 
-        if faction.members.filter(character=character).first():
-            operation.status = operation.st.HTTP_400_BAD_REQUEST
-            raise operation.ex("You are already a Member of that Faction.")
+            if faction.members.filter(character=character).exists():
+                operation.status = operation.st.HTTP_400_BAD_REQUEST
+                raise operation.ex("You are already a Member of that Faction.")
 
-        start_rank = faction.options.get("start_rank")
+            if not (rank := faction.ranks.filter(number=start_rank).first()):
+                operation.status = operation.st.HTTP_400_BAD_REQUEST
+                raise operation.ex(f"That Faction does not have a Rank {start_rank}.")
 
-        if not (rank := faction.ranks.filter(number=start_rank).first()):
-            operation.status = operation.st.HTTP_400_BAD_REQUEST
-            raise operation.ex(f"That Faction does not have a Rank {start_rank}.")
+            rank.holders.create(character=character)
+            invitation.delete()
 
-        faction.members.create(character=character, rank=rank)
-        invitation.delete()
-        message = f"{character} joined {faction.full_path()} as Rank {rank.number} '{rank.name}'."
-        character.msg(f"You have joined {faction.full_path()} as Rank {rank.number} '{rank.name}'.")
+        path = faction.full_path()
+        message = f"{character} joined {path} as Rank {rank.number} '{rank.name}'."
+        delay(0, character.msg, f"You have joined {path} as Rank {rank.number} '{rank.name}'.")
         operation.results = {"success": True, "faction": faction, "character": character, "message": message}
-        staff_alert(message, operation.actor)
+        delay(0, staff_alert, message, operation.actor)
 
     def op_reject(self, operation: Operation):
         faction = self.find_faction(operation)
@@ -649,7 +1015,8 @@ class InvitationManager(models.Manager):
             raise operation.ex("You do not have an Invitation to that Faction.")
 
         invitation.delete()
-        message = f"{character} rejected invitation to {faction.full_path()}."
-        character.msg(f"You have rejected the invitation to join {faction.full_path()}.")
+        path = faction.full_path()
+        message = f"{character} rejected invitation to {path}."
+        delay(0, character.msg, f"You have rejected the invitation to join {path}.")
         operation.results = {"success": True, "faction": faction, "character": character, "message": message}
-        staff_alert(message, operation.actor)
\ No newline at end of file
+        delay(0, staff_alert, message, operation.actor)
\ No newline at end of file
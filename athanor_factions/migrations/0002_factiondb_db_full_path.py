@@ -0,0 +1,28 @@
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    FactionDB = apps.get_model("athanor_factions", "FactionDB")
+
+    def walk(parent, prefix):
+        for faction in FactionDB.objects.filter(db_parent=parent):
+            faction.db_full_path = f"{prefix}/{faction.db_key}" if prefix else faction.db_key
+            faction.save(update_fields=["db_full_path"])
+            walk(faction, faction.db_full_path)
+
+    walk(None, "")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("athanor_factions", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="factiondb",
+            name="db_full_path",
+            field=models.CharField(blank=True, db_index=True, default="", max_length=512),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
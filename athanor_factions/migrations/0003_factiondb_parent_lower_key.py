@@ -0,0 +1,19 @@
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("athanor_factions", "0002_factiondb_db_full_path"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="factiondb",
+            index=models.Index(
+                models.F("db_parent"),
+                django.db.models.functions.text.Lower("db_key"),
+                name="faction_parent_lower_key",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("athanor_factions", "0003_factiondb_parent_lower_key"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="factiondb",
+            index=models.Index(
+                condition=models.Q(db_deleted=False), fields=["db_full_path"], name="faction_active_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="member",
+            index=models.Index(fields=["rank", "character"], name="mem_rank_char_idx"),
+        ),
+    ]
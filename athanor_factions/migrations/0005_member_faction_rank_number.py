@@ -0,0 +1,56 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_from_ranks(apps, schema_editor):
+    Rank = apps.get_model("athanor_factions", "Rank")
+    Member = apps.get_model("athanor_factions", "Member")
+
+    rank = Rank.objects.filter(id=OuterRef("rank_id"))
+    Member.objects.update(
+        faction_id=Subquery(rank.values("faction_id")[:1]),
+        rank_number=Subquery(rank.values("number")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("athanor_factions", "0004_member_rank_char_idx_faction_active_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="member",
+            name="faction",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="members",
+                to="athanor_factions.factiondb",
+            ),
+        ),
+        migrations.AddField(
+            model_name="member",
+            name="rank_number",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(copy_from_ranks, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="member",
+            name="faction",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="members",
+                to="athanor_factions.factiondb",
+            ),
+        ),
+        migrations.AlterModelOptions(
+            name="member",
+            options={"ordering": ["faction_id", "rank_number", "character__db_key"]},
+        ),
+        migrations.AddIndex(
+            model_name="member",
+            index=models.Index(fields=["faction", "rank_number", "character"], name="mem_fac_rank_char_idx"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("athanor_factions", "0005_member_faction_rank_number"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="invitation",
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name="invitation",
+            constraint=models.UniqueConstraint(fields=("character", "faction"), name="uniq_inv_char_faction"),
+        ),
+    ]
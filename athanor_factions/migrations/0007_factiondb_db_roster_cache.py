@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+def build_rosters(apps, schema_editor):
+    FactionDB = apps.get_model("athanor_factions", "FactionDB")
+    Member = apps.get_model("athanor_factions", "Member")
+
+    for faction in FactionDB.objects.all():
+        rows = (Member.objects.filter(faction=faction)
+                .order_by("rank_number", "character__db_key")
+                .values("character__db_key", "rank__name", "rank__number", "rank__data", "data"))
+        faction.db_roster_cache = [
+            {
+                "character": row["character__db_key"],
+                "rank": {"name": row["rank__name"], "number": row["rank__number"], "data": row["rank__data"]},
+                "data": row["data"],
+            }
+            for row in rows
+        ]
+        faction.save(update_fields=["db_roster_cache"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("athanor_factions", "0006_invitation_uniq_inv_char_faction"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="factiondb",
+            name="db_roster_cache",
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(build_rosters, migrations.RunPython.noop),
+    ]
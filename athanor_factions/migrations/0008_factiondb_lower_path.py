@@ -0,0 +1,15 @@
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("athanor_factions", "0007_factiondb_db_roster_cache"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="factiondb",
+            index=models.Index(django.db.models.functions.text.Lower("db_full_path"), name="faction_lower_path"),
+        ),
+    ]
@@ -0,0 +1,14 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("athanor_factions", "0008_factiondb_lower_path"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="factiondb",
+            name="faction_active_idx",
+        ),
+    ]
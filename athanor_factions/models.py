@@ -1,5 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Lower
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.conf import settings
+from evennia.objects.models import ObjectDB
 from evennia.typeclasses.models import TypedObject
 from .managers import FactionDBManager, RankManager, MemberManager, InvitationManager
 
@@ -14,6 +18,22 @@ class FactionDB(TypedObject):
     db_parent = models.ForeignKey("self", related_name="children", null=True, blank=True, on_delete=models.PROTECT)
     db_deleted = models.BooleanField(default=False)
 
+    # Materialized "Parent/Child/Grandchild" path, kept in sync by FactionDBManager.update_path().
+    db_full_path = models.CharField(max_length=512, blank=True, default="", db_index=True)
+
+    # Member.serialize() dicts for the whole roster, rebuilt by FactionDBManager.rebuild_roster()
+    # whenever a Member, Rank or member Character changes. Read it through
+    # FactionDBManager.roster(), since list_light() defers it.
+    db_roster_cache = models.JSONField(blank=True, default=list)
+
+    class Meta(TypedObject.Meta):
+        # Sibling-name checks match case-insensitively within one parent.
+        indexes = [
+            models.Index("db_parent", Lower("db_key"), name="faction_parent_lower_key"),
+            # Full paths typed out in any case resolve through this without walking the tree.
+            models.Index(Lower("db_full_path"), name="faction_lower_path"),
+        ]
+
     def __str__(self):
         return self.key
 
@@ -29,7 +49,15 @@ class Rank(models.Model):
     data = models.JSONField(null=False, default=dict)
 
     def __repr__(self):
-        return f"<{self.faction.full_path()}'s Rank {self.number}: {self.name}>"
+        return f"<{self.faction_path()}'s Rank {self.number}: {self.name}>"
+
+    def faction_path(self) -> str:
+        """
+        The owning Faction's full path. The Faction is taken from the idmapper cache when
+        it's there, so only an uncached Faction not loaded through with_related() costs a query.
+        """
+        faction = FactionDB.get_cached_instance(self.faction_id) or self.faction
+        return faction.db_full_path
 
     def serialize(self):
         return {
@@ -38,6 +66,14 @@ class Rank(models.Model):
             "data": self.data,
         }
 
+    @classmethod
+    def serialize_many(cls, queryset) -> list[dict]:
+        """
+        Same output as serialize() for every Rank in the queryset, read with values()
+        so no Rank instances are built.
+        """
+        return list(queryset.values("name", "number", "data"))
+
     class Meta:
         ordering = ["faction", "number"]
         unique_together = (("faction", "name"), ("faction", "number"))
@@ -49,13 +85,25 @@ class Member(models.Model):
         "objects.ObjectDB", related_name="faction_ranks", on_delete=models.CASCADE
     )
     rank = models.ForeignKey(Rank, related_name="holders", on_delete=models.PROTECT)
+    # Copies of rank.faction and rank.number, filled in by save(), so rosters can be
+    # filtered and sorted without joining Rank. RankManager.op_number keeps rank_number current.
+    faction = models.ForeignKey(FactionDB, related_name="members", on_delete=models.CASCADE)
+    rank_number = models.IntegerField(default=0)
     data = models.JSONField(null=False, default=dict)
 
+    def save(self, *args, **kwargs):
+        self.faction_id = self.rank.faction_id
+        self.rank_number = self.rank.number
+        if (update_fields := kwargs.get("update_fields", None)) is not None and "rank" in update_fields:
+            kwargs["update_fields"] = {*update_fields, "faction", "rank_number"}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return str(self.character)
 
     def __repr__(self):
-        return f"<Rank {self.rank.number} Member of {self.rank.faction.full_path()}: {self.character}>"
+        # Fetches the Rank unless loaded through Member.objects.with_related().
+        return f"<Rank {self.rank.number} Member of {self.rank.faction_path()}: {self.character}>"
 
     def serialize(self):
         return {
@@ -64,8 +112,31 @@ class Member(models.Model):
             "data": self.data,
         }
 
+    @classmethod
+    def serialize_many(cls, queryset) -> list[dict]:
+        """
+        Same output as serialize() for every Member in the queryset, read with values()
+        so no Member, Rank or Character instances are built.
+        """
+        return [cls.serialize_row(row) for row in queryset.values(*cls.serialize_fields)]
+
+    # The values() columns serialize_row() reads.
+    serialize_fields = ("character__db_key", "rank__name", "rank__number", "rank__data", "data")
+
+    @staticmethod
+    def serialize_row(row: dict) -> dict:
+        return {
+            "character": row["character__db_key"],
+            "rank": {"name": row["rank__name"], "number": row["rank__number"], "data": row["rank__data"]},
+            "data": row["data"],
+        }
+
     class Meta:
-        ordering = ["rank__faction", "rank__number", "character__db_key"]
+        ordering = ["faction_id", "rank_number", "character__db_key"]
+        indexes = [
+            models.Index(fields=["rank", "character"], name="mem_rank_char_idx"),
+            models.Index(fields=["faction", "rank_number", "character"], name="mem_fac_rank_char_idx"),
+        ]
 
 
 class Invitation(models.Model):
@@ -77,11 +148,56 @@ class Invitation(models.Model):
                                 on_delete=models.CASCADE)
 
     class Meta:
-        unique_together = (("character", "faction"),)
+        constraints = [
+            models.UniqueConstraint(fields=["character", "faction"], name="uniq_inv_char_faction"),
+        ]
 
     def serialize(self):
         return {
             "character": self.character.key,
-            "faction": self.faction.id,
+            "faction": self.faction_id,
             "inviter": self.inviter.key,
-        }
\ No newline at end of file
+        }
+
+    @classmethod
+    def serialize_many(cls, queryset) -> list[dict]:
+        """
+        Same output as serialize() for every Invitation in the queryset, read with values().
+        """
+        return [
+            {"character": row["character__db_key"], "faction": row["faction_id"], "inviter": row["inviter__db_key"]}
+            for row in queryset.values("character__db_key", "faction_id", "inviter__db_key")
+        ]
+
+
+def _schedule_roster_rebuild(faction_id):
+    transaction.on_commit(lambda: FactionDB.objects.rebuild_roster(faction_id))
+
+
+@receiver(post_save, sender=Member)
+@receiver(post_delete, sender=Member)
+def _member_changed(sender, instance, **kwargs):
+    _schedule_roster_rebuild(instance.faction_id)
+
+
+@receiver(post_save, sender=Rank)
+def _rank_changed(sender, instance, created, **kwargs):
+    # A new Rank has no holders yet, and a Rank with holders can't be deleted.
+    if created:
+        return
+    # Keeps Member.rank_number right however the Rank was renumbered.
+    instance.holders.exclude(rank_number=instance.number).update(rank_number=instance.number)
+    _schedule_roster_rebuild(instance.faction_id)
+
+
+@receiver(post_save)
+def _character_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    # Typeclasses are proxy models and send themselves as sender, so this can't filter
+    # by sender. Rosters store Character names, so a rename has to rebuild them.
+    if created or not isinstance(instance, ObjectDB):
+        return
+    if update_fields is not None and "db_key" not in update_fields:
+        return
+    for faction_id in (Member.objects.filter(character=instance).order_by()
+                       .values_list("faction_id", flat=True).distinct()):
+        _schedule_roster_rebuild(faction_id)
@@ -3,18 +3,32 @@ from evennia.utils.optionclasses import BaseOption
 
 
 class FactionPermissions(BaseOption):
+    """
+    Holds a set of Faction permission names. The value is kept as a frozenset, parsed
+    once when loaded or set, so permission checks can use it directly.
+    """
 
     def validate(self, value, **kwargs):
-        return self.handler.obj.validate_permissions(value)
+        return frozenset(self.handler.obj.validate_permissions(value))
 
     def default(self):
-        return {v for val in self.default_value if (v := val.strip().lower())}
+        return frozenset(filter(None, map(str.lower, map(str.strip, self.default_value))))
 
     def deserialize(self, save_data):
-        return {v for val in save_data if (v := val.strip().lower())}
+        return frozenset(filter(None, map(str.lower, map(str.strip, save_data))))
 
     def serialize(self):
-        return self.value_storage
+        return sorted(self.value_storage)
+
+    def save(self, **kwargs):
+        super().save(**kwargs)
+        if hasattr(self.handler.obj, "clear_permissions_cache"):
+            self.handler.obj.clear_permissions_cache()
 
     def display(self, **kwargs):
-        return " ".join(self.value)
+        # The joined string is kept until the frozenset it was built from is replaced.
+        value = self.value
+        if getattr(self, "_display_of", None) is not value:
+            self._display_of = value
+            self._display = " ".join(sorted(value))
+        return self._display
@@ -0,0 +1,31 @@
+from evennia.utils.test_resources import BaseEvenniaTest
+
+from .factions import DefaultFaction
+from .models import FactionDB
+
+
+class OtherFaction(DefaultFaction):
+    pass
+
+
+class TestUpdatePath(BaseEvenniaTest):
+    def create_faction(self, typeclass, key, parent=None):
+        faction = typeclass.objects.create(db_key=key, db_parent=parent)
+        if not faction.db_full_path:
+            typeclass.objects.update_path(faction)
+        return faction
+
+    def test_mixed_typeclass_subtree(self):
+        root = self.create_faction(DefaultFaction, "Root")
+        child = self.create_faction(OtherFaction, "Child", root)
+        grandchild = self.create_faction(DefaultFaction, "Grand", child)
+
+        root.db_key = "Renamed"
+        root.save(update_fields=["db_key"])
+        DefaultFaction.objects.update_path(root)
+
+        stored = dict(FactionDB.objects.filter(
+            id__in=[root.id, child.id, grandchild.id]).values_list("id", "db_full_path"))
+        self.assertEqual(stored[root.id], "Renamed")
+        self.assertEqual(stored[child.id], "Renamed/Child")
+        self.assertEqual(stored[grandchild.id], "Renamed/Child/Grand")
@@ -0,0 +1,47 @@
+import bisect
+import typing
+
+from twisted.internet import reactor
+
+
+def turn_cache(obj, name: str) -> dict:
+    """
+    Returns a dict stored in obj's NAttributes which is discarded at the end of the
+    current reactor turn. In practice, that means it lives for the rest of the command
+    being processed.
+
+    Outside a running reactor (such as in evennia shell) nothing could ever clear it,
+    so a fresh dict is handed back on every call instead.
+    """
+    if not reactor.running or not hasattr(obj, "nattributes"):
+        return dict()
+    key = f"_faction_{name}"
+    if (cache := obj.nattributes.get(key)) is None:
+        cache = dict()
+        obj.nattributes.add(key, cache)
+        reactor.callLater(0, obj.nattributes.remove, key)
+    return cache
+
+
+def prefix_match(match_text: str, sorted_choices: typing.Sequence[str]) -> typing.Optional[str]:
+    """
+    A binary-search take on athanor.utils.partial_match for already-sorted strings.
+    An exact match wins, otherwise the shortest choice starting with match_text does.
+
+    Args:
+        match_text (str): The string being searched for.
+        sorted_choices (list of str): Candidates, sorted and in the same case as match_text.
+
+    Returns:
+        str or None.
+    """
+    found = None
+    for i in range(bisect.bisect_left(sorted_choices, match_text), len(sorted_choices)):
+        choice = sorted_choices[i]
+        if not choice.startswith(match_text):
+            break
+        if choice == match_text:
+            return choice
+        if found is None or len(choice) < len(found):
+            found = choice
+    return found